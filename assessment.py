@@ -1,15 +1,20 @@
 # 安装命令：pip install streamlit pandas openpyxl
-# 可选：pip install python-docx (如果要从 questions.doc 生成题库)
+# 可选：pip install python-docx lxml (如果要从 questions.doc 生成题库 / 导出 Word 报告)
 # 运行命令：streamlit run assessment.py
 
 import streamlit as st
 import pandas as pd
+import numpy as np
+import openpyxl
 from pathlib import Path
 from datetime import datetime
 import re
 import random
 import json
 import io
+import zipfile
+import threading
+import uuid
 
 # 尝试导入 docx，如果没有安装则设为 None
 try:
@@ -19,11 +24,20 @@ except ImportError:
     HAS_DOCX = False
     Document = None
 
+# lxml 用于流式解析 docx（python-docx 的依赖，通常随其一起安装）
+try:
+    from lxml import etree
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+    etree = None
+
 import os
 
 # 配置
 QUESTIONS_FILE = Path("questions.xlsx")
 RESULTS_FILE = Path("results.xlsx")
+RESULTS_LOG = Path("results_pending.jsonl")  # 待合并到结果表的提交记录（每行一条 JSON）
 CONFIG_FILE = Path("config.py")
 
 # 加载或初始化管理员密码
@@ -43,9 +57,14 @@ def save_admin_password(new_password):
     global ADMIN_PASSWORD
     ADMIN_PASSWORD = new_password
 
-# 题库列表
+# 默认题库列表（题库文件不存在或无法读取时使用；实际题库以文件中的 Sheet 为准，见 list_banks）
 BANK_NAMES = ["题库一", "题库二", "题库三"]
 
+# 系统内部题目表的列顺序
+CANONICAL_COLS = ('ID', 'Bank', 'Question', 'Option_A', 'Score_A',
+                  'Option_B', 'Score_B', 'Option_C', 'Score_C',
+                  'Option_D', 'Score_D')
+
 st.set_page_config(page_title="企业员工面试测评系统", page_icon="🧭", layout="wide")
 
 # 自定义CSS样式
@@ -84,112 +103,181 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+# WordprocessingML 命名空间
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# 选项解析用正则（模块级预编译，避免在逐段落循环中重复编译）
+_OPT_PREFIX_RE = re.compile(r'^[A-D][\.、]\s*')
+_OPT_FULL_RE = re.compile(r'^([A-D])[\.、]\s*(.+?)(?:（(\d+)分）|\((\d+)分\)|（(\d+)）|\((\d+)\))?\s*$')
+_PREFIX_TUPLE = ('A.', 'B.', 'C.', 'D.', 'A、', 'B、', 'C、', 'D、')
+
+
+def _docx_style_names(zf: zipfile.ZipFile) -> dict:
+    """读取 styles.xml，返回 样式ID -> 样式名称 的映射"""
+    try:
+        root = etree.fromstring(zf.read("word/styles.xml"))
+    except KeyError:
+        return {}
+    names = {}
+    for style in root.iter(f"{_W}style"):
+        name_el = style.find(f"{_W}name")
+        if name_el is None:
+            continue
+        name = name_el.get(f"{_W}val", "")
+        # 内置标题样式在文件中为小写（heading 1），与 python-docx 的显示名称保持一致
+        if name.startswith("heading "):
+            name = "H" + name[1:]
+        names[style.get(f"{_W}styleId")] = name
+    return names
+
+
+def _docx_paragraph_text(p) -> str:
+    """拼接段落中各 run 的文本，制表符/换行与 python-docx 的 Paragraph.text 一致"""
+    parts = []
+    for el in p.iter(f"{_W}t", f"{_W}tab", f"{_W}br", f"{_W}cr"):
+        # 只取 run 内的元素（pPr 中的 w:tab 是制表位定义）
+        if el.getparent().tag != f"{_W}r":
+            continue
+        if el.tag == f"{_W}t":
+            parts.append(el.text or "")
+        elif el.tag == f"{_W}tab":
+            parts.append("\t")
+        elif el.tag == f"{_W}cr" or el.get(f"{_W}type", "textWrapping") == "textWrapping":
+            # 分页符/分栏符不产生文本
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _iter_docx_paragraphs(doc_path: Path):
+    """
+    流式读取 docx 正文段落，逐个产出 (文本, 样式名称)
+    直接解析 word/document.xml，不构建完整文档对象，内存占用与单个段落相当
+    """
+    body_tag = f"{_W}body"
+    with zipfile.ZipFile(doc_path) as zf:
+        style_names = _docx_style_names(zf)
+        with zf.open("word/document.xml") as stream:
+            for _, p in etree.iterparse(stream, events=("end",), tag=f"{_W}p"):
+                # 只处理正文中的段落（与 Document.paragraphs 一致），表格内段落随表格一起释放
+                if p.getparent().tag != body_tag:
+                    continue
+                text = _docx_paragraph_text(p)
+                style_el = p.find(f"{_W}pPr/{_W}pStyle")
+                style_id = style_el.get(f"{_W}val") if style_el is not None else None
+                yield text, style_names.get(style_id, "")
+                # 释放已处理的节点
+                p.clear()
+                while p.getprevious() is not None:
+                    del p.getparent()[0]
+
+
 def parse_questions_from_doc(doc_path: Path, bank_name: str) -> list:
     """
     从 doc 文件解析题目
     一级标题 -> 题目
     二级标题 -> 选项（A/B/C/D）
-    返回格式：题目字典列表
+    返回格式：题目字典列表；文档无法解析时抛出异常，由调用方处理
     """
-    if not HAS_DOCX:
+    if not HAS_LXML:
         return []
     
     if not doc_path.exists():
         return []
     
-    try:
-        doc = Document(str(doc_path))
-        questions = []
-        current_question = None
-        option_count = 0
+    questions = []
+    current_question = None
+    option_count = 0
+    
+    for raw_text, style_name in _iter_docx_paragraphs(doc_path):
+        text = raw_text.strip()
+        if not text:
+            continue
         
-        for para in doc.paragraphs:
-            text = para.text.strip()
-            if not text:
-                continue
-            
-            style_name = para.style.name if para.style else ""
+        # 一级标题作为题目
+        if style_name.startswith('Heading 1') or (len(text) > 10 and not text.startswith(_PREFIX_TUPLE)):
+            # 如果有之前的题目未完成，先保存
+            if current_question and option_count >= 4:
+                questions.append(current_question)
             
-            # 一级标题作为题目
-            if style_name.startswith('Heading 1') or (len(text) > 10 and not text.startswith(('A.', 'B.', 'C.', 'D.', 'A、', 'B、', 'C、', 'D、'))):
-                # 如果有之前的题目未完成，先保存
-                if current_question and option_count >= 4:
-                    questions.append(current_question)
-                
-                # 创建新题目
-                current_question = {
-                    'ID': len(questions) + 1,
-                    'Bank': bank_name,
-                    'Question': text,
-                    'Option_A': '',
-                    'Score_A': 0,
-                    'Option_B': '',
-                    'Score_B': 0,
-                    'Option_C': '',
-                    'Score_C': 0,
-                    'Option_D': '',
-                    'Score_D': 0,
-                }
-                option_count = 0
-            
-            # 二级标题或选项格式（A. B. C. D.）
-            elif style_name.startswith('Heading 2') or re.match(r'^[A-D][\.、]\s*', text):
-                if current_question:
-                    # 提取选项文本和分数
-                    match = re.match(r'^([A-D])[\.、]\s*(.+?)(?:（(\d+)分）|\((\d+)分\)|（(\d+)）|\((\d+)\))?\s*$', text)
-                    if match:
-                        option_letter = match.group(1)
-                        option_text = match.group(2).strip()
-                        score = 0
-                        # 提取分数
-                        for i in range(3, 8):
-                            if match.group(i):
-                                try:
-                                    score = int(match.group(i))
-                                    break
-                                except:
-                                    pass
-                        
-                        if option_letter in ['A', 'B', 'C', 'D']:
-                            current_question[f'Option_{option_letter}'] = option_text
-                            current_question[f'Score_{option_letter}'] = score
-                            option_count += 1
-        
-        # 保存最后一个题目
-        if current_question and option_count >= 4:
-            questions.append(current_question)
+            # 创建新题目
+            current_question = {
+                'ID': len(questions) + 1,
+                'Bank': bank_name,
+                'Question': text,
+                'Option_A': '',
+                'Score_A': 0,
+                'Option_B': '',
+                'Score_B': 0,
+                'Option_C': '',
+                'Score_C': 0,
+                'Option_D': '',
+                'Score_D': 0,
+            }
+            option_count = 0
         
-        return questions
-    except Exception as e:
-        st.error(f"解析文档时出错: {e}")
-        return []
+        # 二级标题或选项格式（A. B. C. D.）
+        elif style_name.startswith('Heading 2') or _OPT_PREFIX_RE.match(text):
+            if current_question:
+                # 提取选项文本和分数
+                match = _OPT_FULL_RE.match(text)
+                if match:
+                    option_letter = match.group(1)
+                    option_text = match.group(2).strip()
+                    score = 0
+                    # 提取分数
+                    for i in range(3, 8):
+                        if match.group(i):
+                            try:
+                                score = int(match.group(i))
+                                break
+                            except:
+                                pass
+                    
+                    if option_letter in ['A', 'B', 'C', 'D']:
+                        current_question[f'Option_{option_letter}'] = option_text
+                        current_question[f'Score_{option_letter}'] = score
+                        option_count += 1
+    
+    # 保存最后一个题目
+    if current_question and option_count >= 4:
+        questions.append(current_question)
+    
+    return questions
 
 
-def init_db():
-    """初始化题库和结果文件"""
+@st.cache_resource(show_spinner="正在初始化题库...")
+def init_db() -> list:
+    """
+    初始化题库和结果文件
+    每个进程只执行一次，避免每次页面交互都检查文件；
+    缓存内部对首次调用加锁，多个会话同时打开页面时也不会重复生成文件
+    缓存函数内不输出任何页面元素（否则每次重跑都会回放），
+    返回需要提示的消息列表 [(级别, 文本)]，由 main() 显示
+    """
+    notices = []
     # 如果存在 questions.doc，尝试从文档生成题库
     doc_path = Path("questions.doc")
     if not doc_path.exists():
         doc_path = Path("questions.docx")
     
-    if doc_path.exists() and HAS_DOCX and not QUESTIONS_FILE.exists():
-        st.info("正在从文档文件生成题库...")
-        
+    if doc_path.exists() and HAS_LXML and not QUESTIONS_FILE.exists():
         with pd.ExcelWriter(QUESTIONS_FILE, engine='openpyxl') as writer:
             for bank_name in BANK_NAMES:
-                questions = parse_questions_from_doc(doc_path, bank_name)
+                try:
+                    questions = parse_questions_from_doc(doc_path, bank_name)
+                except Exception as e:
+                    notices.append(("error", f"解析文档时出错: {e}"))
+                    questions = []
                 
                 if questions:
                     df = pd.DataFrame(questions)
-                    df = df[['ID', 'Bank', 'Question', 'Option_A', 'Score_A', 
-                            'Option_B', 'Score_B', 'Option_C', 'Score_C', 
-                            'Option_D', 'Score_D']]
+                    df = df[list(CANONICAL_COLS)]
                     df.to_excel(writer, sheet_name=bank_name, index=False)
                 else:
                     # 如果解析失败，创建默认10道题目
                     create_default_questions_for_bank(writer, bank_name)
         
-        st.success("已从文档文件生成题库")
+        notices.append(("success", "已从文档文件生成题库"))
     elif not QUESTIONS_FILE.exists():
         # 创建默认题库
         with pd.ExcelWriter(QUESTIONS_FILE, engine='openpyxl') as writer:
@@ -201,6 +289,7 @@ def init_db():
         pd.DataFrame(
             columns=["Timestamp", "Name", "Phone", "Total_Score", "Details", "Bank"]
         ).to_excel(RESULTS_FILE, index=False)
+    return notices
 
 
 def create_default_questions_for_bank(writer, bank_name: str):
@@ -263,161 +352,326 @@ def create_default_questions_for_bank(writer, bank_name: str):
         },
     ]
     
-    # 生成10道题目（重复使用base题目）
-    questions = []
-    for i in range(10):
-        base_q = base_questions[i % len(base_questions)].copy()
-        base_q['ID'] = i + 1
-        base_q['Bank'] = bank_name
-        questions.append(base_q)
-    
-    df = pd.DataFrame(questions)
-    df = df[['ID', 'Bank', 'Question', 'Option_A', 'Score_A', 
-            'Option_B', 'Score_B', 'Option_C', 'Score_C', 
-            'Option_D', 'Score_D']]
+    # 生成10道题目（循环重复使用base题目）
+    base = pd.DataFrame(base_questions)
+    df = base.iloc[np.resize(np.arange(len(base)), 10)].reset_index(drop=True)
+    df.insert(0, 'ID', np.arange(1, len(df) + 1))
+    df.insert(1, 'Bank', bank_name)
+    df = df[list(CANONICAL_COLS)]
     df.to_excel(writer, sheet_name=bank_name, index=False)
 
 
-@st.cache_data
-def load_questions(bank_name: str = None) -> pd.DataFrame:
-    """加载指定题库或所有题库"""
-    
-    def normalize_df(df, bank):
-        """将新版Excel格式转换为系统内部格式"""
-        # 检查是否为新格式（包含"题目"列）
-        if "题目" in df.columns:
-            new_rows = []
-            for idx, row in df.iterrows():
-                new_row = {
-                    "ID": idx + 1,
-                    "Bank": bank,
-                    "Question": row["题目"],
-                    "Option_A": row.get("选项1", ""),
-                    "Score_A": row.get("分值1", 0),
-                    "Option_B": row.get("选项2", ""),
-                    "Score_B": row.get("分值2", 0),
-                    "Option_C": row.get("选项3", ""),
-                    "Score_C": row.get("分值3", 0),
-                    "Option_D": row.get("选项4", ""),
-                    "Score_D": row.get("分值4", 0),
-                }
-                new_rows.append(new_row)
-            return pd.DataFrame(new_rows)
-        return df
+def _open_workbook(path: Path):
+    """以只读模式打开工作簿（流式读取，不构建完整对象树）"""
+    return openpyxl.load_workbook(path, read_only=True, data_only=True, keep_links=False)
+
+
+def _sheet_to_df(ws) -> pd.DataFrame:
+    """将工作表一次性读取为 DataFrame，首行作为表头"""
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    # 只读模式按工作表记录的尺寸读取，设置过格式的空单元格也会带出空表头，去掉尾部空表头
+    width = len(header)
+    while width and header[width - 1] is None:
+        width -= 1
+    header = header[:width]
+    # 只读模式下可能带出尾部空行，跳过全空行；
+    # 未记录尺寸的工作表各行长度不一，按表头宽度补齐/截断
+    data = []
+    for r in rows:
+        r = (r + (None,) * width)[:width]
+        if any(v is not None for v in r):
+            data.append(r)
+    df = pd.DataFrame(data, columns=header)
+    # 与 pd.read_excel 一致：以文本形式存储的数字（如 "5"）转换为数值列
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if pd.api.types.is_numeric_dtype(col) or not col.notna().any():
+            continue
+        converted = pd.to_numeric(col, errors="coerce")
+        if converted.notna().sum() == col.notna().sum():
+            df.isetitem(i, converted)
+    return df
+
+
+# 新版Excel格式（中文表头）到系统内部格式的列名映射
+_RENAME_MAP = {
+    "题目": "Question",
+    "选项1": "Option_A", "分值1": "Score_A",
+    "选项2": "Option_B", "分值2": "Score_B",
+    "选项3": "Option_C", "分值3": "Score_C",
+    "选项4": "Option_D", "分值4": "Score_D",
+}
+
+# 新版Excel中缺少某列时的默认值
+_COL_DEFAULTS = {
+    "Option_A": "", "Score_A": 0,
+    "Option_B": "", "Score_B": 0,
+    "Option_C": "", "Score_C": 0,
+    "Option_D": "", "Score_D": 0,
+}
+
+
+def normalize_df(df: pd.DataFrame, bank: str) -> pd.DataFrame:
+    """将新版Excel格式转换为系统内部格式"""
+    # 检查是否为新格式（包含"题目"列）
+    if "题目" in df.columns:
+        out = df.rename(columns=_RENAME_MAP)
+        missing = {c: v for c, v in _COL_DEFAULTS.items() if c not in out.columns}
+        if missing:
+            out = out.assign(**missing)
+        out["ID"] = np.arange(1, len(out) + 1)
+        out["Bank"] = bank
+        return out[list(CANONICAL_COLS)]
+    return df
+
+
+def _questions_mtime() -> float:
+    """题库文件的修改时间，作为缓存键"""
+    try:
+        return QUESTIONS_FILE.stat().st_mtime
+    except OSError:
+        return 0.0
 
-    if bank_name:
-        try:
-            df = pd.read_excel(QUESTIONS_FILE, sheet_name=bank_name)
-            return normalize_df(df, bank_name)
-        except:
-            return pd.DataFrame()
-    else:
-        # 加载所有题库
-        all_questions = []
-        # 获取Excel中所有的Sheet名
-        try:
-            xl = pd.ExcelFile(QUESTIONS_FILE)
-            sheet_names = xl.sheet_names
-        except:
-            sheet_names = BANK_NAMES
 
-        for bank in sheet_names:
+@st.cache_resource(max_entries=1)
+def _questions_cache(mtime: float) -> dict:
+    """
+    一次性解析题库文件中的所有题库
+    以文件修改时间为键缓存，避免每次页面交互（脚本重跑）都重新解析 Excel
+    返回格式：{题库名: DataFrame}
+    注意：返回的 DataFrame 为所有会话共享的同一对象，调用方不得原地修改（需要修改时先 copy）
+    """
+    banks = {}
+    try:
+        wb = _open_workbook(QUESTIONS_FILE)
+    except:
+        return banks
+
+    try:
+        for bank in wb.sheetnames:
             try:
-                df = pd.read_excel(QUESTIONS_FILE, sheet_name=bank)
-                df = normalize_df(df, bank)
+                df = normalize_df(_sheet_to_df(wb[bank]), bank)
                 if not df.empty:
                     # 确保ID列存在
                     if 'ID' not in df.columns:
                         df['ID'] = range(1, len(df) + 1)
                     if 'Bank' not in df.columns:
                         df['Bank'] = bank
-                    all_questions.append(df)
+                # 分值必须为数值，否则向量化计分会变成字符串拼接；无法识别的分值按 0 分处理
+                for col in ("Score_A", "Score_B", "Score_C", "Score_D"):
+                    if col in df.columns:
+                        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+                banks[bank] = df
             except:
                 continue
-        if all_questions:
-            return pd.concat(all_questions, ignore_index=True)
-        return pd.DataFrame()
+    finally:
+        wb.close()
+    return banks
+
+
+def list_banks() -> list:
+    """获取题库文件中的所有题库（Sheet）名称"""
+    banks = list(_questions_cache(_questions_mtime()))
+    return banks or BANK_NAMES
+
+
+def load_questions(bank_name: str = None) -> pd.DataFrame:
+    """加载指定题库或所有题库（单个题库返回缓存中的共享对象，不得原地修改）"""
+    banks = _questions_cache(_questions_mtime())
+
+    if bank_name:
+        return banks.get(bank_name, pd.DataFrame())
+
+    # 加载所有题库
+    all_questions = [df for df in banks.values() if not df.empty]
+    if all_questions:
+        return pd.concat(all_questions, ignore_index=True)
+    return pd.DataFrame()
+
+
+def _df_rows(df: pd.DataFrame):
+    """逐行产出 DataFrame 的值元组，缺失值转为 None（写入空单元格）"""
+    values = df.astype(object).where(df.notna(), None)
+    return values.itertuples(index=False, name=None)
 
 
 def save_questions(df: pd.DataFrame, bank_name: str):
     """保存题库到指定sheet"""
-    # 读取现有的所有sheet
-    existing_data = {}
-    for bank in BANK_NAMES:
+    # 一次性读取现有的所有sheet（包括默认列表之外新增的题库）
+    # 未修改的sheet按原始内容读取后原样写回，不取 _questions_cache 中的数据：
+    # 缓存中是规范化后的格式，写回会把中文表头的题库改写成内部格式，并丢弃选项5~10等列
+    existing_data = {bank: pd.DataFrame() for bank in BANK_NAMES}
+    try:
+        wb = _open_workbook(QUESTIONS_FILE)
         try:
-            existing_data[bank] = pd.read_excel(QUESTIONS_FILE, sheet_name=bank)
-        except:
-            existing_data[bank] = pd.DataFrame()
+            for bank in wb.sheetnames:
+                existing_data[bank] = _sheet_to_df(wb[bank])
+        finally:
+            wb.close()
+    except:
+        pass
     
     # 更新当前题库
     existing_data[bank_name] = df
     
     # 保存所有sheet
-    with pd.ExcelWriter(QUESTIONS_FILE, engine='openpyxl') as writer:
-        for bank, bank_df in existing_data.items():
-            bank_df.to_excel(writer, sheet_name=bank, index=False)
+    _write_workbook(QUESTIONS_FILE, existing_data)
+    _questions_cache.clear()
+
+
+def _write_workbook(path: Path, sheets: dict):
+    """以只写（流式）模式写出工作簿，sheets 格式：{Sheet名: DataFrame}"""
+    wb = openpyxl.Workbook(write_only=True)
+    for sheet_name, sheet_df in sheets.items():
+        ws = wb.create_sheet(sheet_name)
+        ws.append(list(sheet_df.columns))
+        for row in _df_rows(sheet_df):
+            ws.append(row)
+    wb.save(path)
+
+
+@st.cache_data(max_entries=1)
+def _results_cache(mtime: float) -> pd.DataFrame:
+    """以文件修改时间为键缓存成绩表，管理后台交互时不再重复解析 Excel"""
+    wb = _open_workbook(RESULTS_FILE)
+    try:
+        df = _sheet_to_df(wb.worksheets[0])
+    finally:
+        wb.close()
+    # 确保新字段存在
+    if "Answer_Details" not in df.columns:
+        df["Answer_Details"] = ""
+    # 统一类型为字符串，填充缺失
+    df["Answer_Details"] = df["Answer_Details"].apply(
+        lambda v: "" if pd.isna(v) else (json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else str(v))
+    )
+    return df
 
 
 def load_results() -> pd.DataFrame:
     """加载结果数据"""
+    if not _merge_pending_results():
+        st.warning("成绩文件被占用（如正在 Excel 中打开），部分新提交暂未写入 results.xlsx，关闭文件后刷新即可。")
     if RESULTS_FILE.exists():
-        df = pd.read_excel(RESULTS_FILE)
-        # 确保新字段存在
-        if "Answer_Details" not in df.columns:
-            df["Answer_Details"] = ""
-        # 统一类型为字符串，填充缺失
-        df["Answer_Details"] = df["Answer_Details"].apply(
-            lambda v: "" if pd.isna(v) else (json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else str(v))
-        )
-        return df
+        return _results_cache(RESULTS_FILE.stat().st_mtime)
     return pd.DataFrame(columns=["Timestamp", "Name", "Phone", "Total_Score", "Details", "Bank", "Answer_Details"])
 
 
-def save_result(new_row: dict):
-    """保存考试结果"""
-    df_res = load_results()
-    df_res = pd.concat([df_res, pd.DataFrame([new_row])], ignore_index=True)
-    df_res.to_excel(RESULTS_FILE, index=False)
+@st.cache_resource
+def _results_lock() -> threading.Lock:
+    """结果表写入锁（所有会话共用同一进程，需进程级互斥）"""
+    return threading.Lock()
 
 
-def candidate_view():
-    """候选人视图 - 随机展示题目"""
-    st.header("🎯 候选人测评")
-    st.write("请完成以下信息并作答。")
+def save_result(new_row: dict):
+    """
+    保存考试结果（直接追加到结果表末尾）
+    结果表被占用无法写入时，先记入待合并日志，之后再补写
+    """
+    # 唯一提交编号，用于补写日志时识别已写入的记录
+    new_row = {**new_row, "Submission_ID": uuid.uuid4().hex}
+    with _results_lock():
+        if not _merge_pending_locked([new_row]):
+            with open(RESULTS_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(new_row, ensure_ascii=False) + "\n")
 
-    name = st.text_input("姓名 (必填)", key="candidate_name")
-    phone = st.text_input("手机号 (必填)", key="candidate_phone")
 
-    # 随机选择一个题库
-    if not 'selected_bank_seed' in st.session_state:
-        # 获取所有可用的题库名称
-        try:
-            xl = pd.ExcelFile(QUESTIONS_FILE)
-            available_banks = xl.sheet_names
-        except:
-            available_banks = BANK_NAMES
-            
-        if available_banks:
-            st.session_state.selected_bank_seed = random.choice(available_banks)
-        else:
-            st.session_state.selected_bank_seed = BANK_NAMES[0]
+def _append_results(rows: list, replayed_rows: list = ()):
+    """
+    在结果表末尾追加多行
+    replayed_rows 为从待合并日志补写的记录，已写入过的（Submission_ID 相同）会跳过；rows 总是写入
+    """
+    if RESULTS_FILE.exists():
+        wb = openpyxl.load_workbook(RESULTS_FILE)
+    else:
+        wb = openpyxl.Workbook()
+    # 与 _results_cache 读取同一个 Sheet
+    ws = wb.worksheets[0]
+    header = [c.value for c in ws[1] if c.value is not None]
     
-    selected_bank = st.session_state.selected_bank_seed
+    if replayed_rows:
+        written = set()
+        if "Submission_ID" in header:
+            col = header.index("Submission_ID") + 1
+            for (sid,) in ws.iter_rows(min_row=2, min_col=col, max_col=col, values_only=True):
+                if sid:
+                    written.add(sid)
+        replayed_rows = [
+            r for r in replayed_rows
+            if not r.get("Submission_ID") or r["Submission_ID"] not in written
+        ]
+    all_rows = list(replayed_rows) + list(rows)
     
-    # 加载该题库所有题目
-    questions_list = load_questions(selected_bank)
+    # 旧版结果文件可能缺少新字段（如 Answer_Details），补齐表头
+    for new_row in all_rows:
+        for key in new_row:
+            if key not in header:
+                header.append(key)
+                ws.cell(row=1, column=len(header), value=key)
     
-    if questions_list.empty:
-        st.error("题库为空，请联系管理员。")
-        return
+    for new_row in all_rows:
+        ws.append([new_row.get(col) for col in header])
+    wb.save(RESULTS_FILE)
+
+
+def _merge_pending_results() -> bool:
+    """将待合并日志中的提交记录写入结果表，返回是否写入成功"""
+    with _results_lock():
+        return _merge_pending_locked()
+
+
+def _merge_pending_locked(extra_rows: list = ()) -> bool:
+    """
+    合并待写入记录（调用方需持有 _results_lock）
+    写入失败时保留 .merging 文件，下次再合并；extra_rows 的写入由调用方兜底
+    """
+    merging = RESULTS_LOG.with_suffix(".merging")
+    if RESULTS_LOG.exists():
+        if merging.exists():
+            # 上次合并未完成，将新日志并入其后
+            with open(RESULTS_LOG, encoding="utf-8") as src, open(merging, "a", encoding="utf-8") as dst:
+                dst.write(src.read())
+            RESULTS_LOG.unlink(missing_ok=True)
+        else:
+            os.replace(RESULTS_LOG, merging)
     
-    # 随机打乱题目顺序
-    # 使用 session_state 保持题目顺序，避免交互时刷新
-    if 'shuffled_questions' not in st.session_state or st.session_state.current_bank != selected_bank:
-        st.session_state.shuffled_questions = questions_list.sample(frac=1).reset_index(drop=True)
-        st.session_state.current_bank = selected_bank
-        
-    questions_list = st.session_state.shuffled_questions
+    replayed = []
+    if merging.exists():
+        with open(merging, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    replayed.append(json.loads(line))
+                except ValueError:
+                    continue
+    if not replayed and not extra_rows:
+        merging.unlink(missing_ok=True)
+        return True
+    
+    try:
+        _append_results(list(extra_rows), replayed)
+    except Exception:
+        return False
+    merging.unlink(missing_ok=True)
+    return True
+
+
+@st.fragment
+def _questions_fragment(questions_list: pd.DataFrame, perm, name: str, phone: str):
+    """
+    题目作答与提交区域
+    作为 fragment 渲染：切换选项时只重跑本区域，不重跑整个页面
+    """
+    # 按打乱后的顺序取出各列
+    question_arr = questions_list["Question"].to_numpy()[perm]
+    id_arr = questions_list["ID"].to_numpy()[perm]
+    bank_arr = questions_list["Bank"].to_numpy()[perm]
+    # 选项文本按 A-D 顺序预先取出，按字母偏移索引
+    option_arr = questions_list[["Option_A", "Option_B", "Option_C", "Option_D"]].to_numpy()[perm]
     
     st.divider()
     st.subheader("请完成以下题目：")
@@ -425,20 +679,14 @@ def candidate_view():
     answers = {}
     
     # 显示所有题目（随机顺序）
-    for idx, row in questions_list.iterrows():
-        qid = f"{row.get('Bank', '')}_{row['ID']}"  # 使用题库+ID作为唯一标识
-        # bank = row.get("Bank", "未知题库") # 不再显示题库
-        prompt = f"{idx + 1}. {row['Question']}"
+    for idx in range(len(perm)):
+        qid = f"{bank_arr[idx]}_{id_arr[idx]}"  # 使用题库+ID作为唯一标识
+        prompt = f"{idx + 1}. {question_arr[idx]}"
         
         choice = st.radio(
             prompt,
             options=["A", "B", "C", "D"],
-            format_func=lambda x, r=row: {
-                "A": r["Option_A"],
-                "B": r["Option_B"],
-                "C": r["Option_C"],
-                "D": r["Option_D"],
-            }[x],
+            format_func=lambda x, o=option_arr[idx]: o[ord(x) - 65],
             key=f"q_{qid}_{idx}",
         )
         answers[qid] = choice
@@ -449,41 +697,41 @@ def candidate_view():
             st.warning("姓名和手机号为必填项。")
             return
 
-        # 计算总分 - 通过索引匹配
-        total_score = 0
-        bank_scores = {}
-        detailed_answers = []
+        # 计算总分 - 通过索引匹配（答案顺序与题目顺序一致）
+        choices = list(answers.values())[:len(perm)]
+        n = len(choices)
+        # 选项字母 A-D 编码为列下标 0-3，一次性取出每题得分
+        col_idx = np.frombuffer("".join(choices).encode(), dtype=np.uint8) - ord("A")
+        score_arr = questions_list[["Score_A", "Score_B", "Score_C", "Score_D"]].to_numpy()[perm[:n]]
         
-        # 使用索引来匹配答案和题目
-        answer_list = list(answers.items())
-        for idx, (qid_key, choice) in enumerate(answer_list):
-            if idx < len(questions_list):
-                row = questions_list.iloc[idx]
-                score = row[f"Score_{choice}"]
-                total_score += score
-                
-                bank = row.get("Bank", "未知")
-                if bank not in bank_scores:
-                    bank_scores[bank] = 0
-                bank_scores[bank] += score
-                
-                # 记录详细答题情况
-                detailed_answers.append({
-                    "Question": row['Question'],
-                    "Selected_Option": choice,
-                    "Selected_Text": row[f"Option_{choice}"],
-                    "Score": int(score),
-                    "Bank": bank,
-                    "Options": {
-                        "A": f"{row['Option_A']} ({row['Score_A']}分)",
-                        "B": f"{row['Option_B']} ({row['Score_B']}分)",
-                        "C": f"{row['Option_C']} ({row['Score_C']}分)",
-                        "D": f"{row['Option_D']} ({row['Score_D']}分)",
-                    }
-                })
+        scores = score_arr[np.arange(n), col_idx]
+        total_score = scores.sum()
+        # 按题库汇总得分（保持题库首次出现的顺序）
+        bank_scores = pd.Series(scores).groupby(bank_arr[:n], sort=False).sum().astype(int).to_dict()
+        
+        detailed_answers = []
+        for idx, choice in enumerate(choices):
+            score = scores[idx]
+            bank = bank_arr[idx]
+            opts = option_arr[idx]
+            opt_scores = score_arr[idx]
+            # 记录详细答题情况
+            detailed_answers.append({
+                "Question": question_arr[idx],
+                "Selected_Option": choice,
+                "Selected_Text": opts[col_idx[idx]],
+                "Score": int(score),
+                "Bank": bank,
+                "Options": {
+                    "A": f"{opts[0]} ({opt_scores[0]}分)",
+                    "B": f"{opts[1]} ({opt_scores[1]}分)",
+                    "C": f"{opts[2]} ({opt_scores[2]}分)",
+                    "D": f"{opts[3]} ({opt_scores[3]}分)",
+                }
+            })
 
         new_row = {
-            "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "Timestamp": datetime.now().isoformat(sep=" ", timespec="seconds"),
             "Name": name.strip(),
             "Phone": phone.strip(),
             "Total_Score": int(total_score),
@@ -499,6 +747,46 @@ def candidate_view():
         st.info("请等待面试官进一步通知。")
 
 
+def candidate_view():
+    """候选人视图 - 随机展示题目"""
+    st.header("🎯 候选人测评")
+    st.write("请完成以下信息并作答。")
+
+    name = st.text_input("姓名 (必填)", key="candidate_name")
+    phone = st.text_input("手机号 (必填)", key="candidate_phone")
+
+    # 随机选择一个题库
+    if not 'selected_bank_seed' in st.session_state:
+        # 获取所有可用的题库名称
+        available_banks = list_banks()
+
+        if available_banks:
+            st.session_state.selected_bank_seed = random.choice(available_banks)
+        else:
+            st.session_state.selected_bank_seed = BANK_NAMES[0]
+    
+    selected_bank = st.session_state.selected_bank_seed
+    
+    # 加载该题库所有题目
+    questions_list = load_questions(selected_bank)
+    
+    if questions_list.empty:
+        st.error("题库为空，请联系管理员。")
+        return
+    
+    # 随机打乱题目顺序
+    # 使用 session_state 仅保存打乱后的行号，题目数据仍共用缓存中的 DataFrame
+    if ('perm' not in st.session_state
+            or st.session_state.current_bank != selected_bank
+            or len(st.session_state.perm) != len(questions_list)):
+        st.session_state.perm = np.random.permutation(len(questions_list))
+        st.session_state.current_bank = selected_bank
+        
+    perm = st.session_state.perm
+    
+    _questions_fragment(questions_list, perm, name, phone)
+
+
 def generate_word_report(row):
     """生成Word格式的成绩报告"""
     if not HAS_DOCX:
@@ -578,7 +866,7 @@ def generate_word_report(row):
             # 清理选择的选项文本中的冗余标签
             selected_text = str(item.get('Selected_Text', '')).strip()
             # 移除可能的 A. 或 A、 前缀
-            selected_text = re.sub(r'^[A-D][.、]\s*', '', selected_text)
+            selected_text = _OPT_PREFIX_RE.sub('', selected_text)
             
             doc.add_paragraph(f"选择: {item['Selected_Option']}. {selected_text}")
             doc.add_paragraph(f"得分: {int(item['Score'])}")
@@ -590,7 +878,7 @@ def generate_word_report(row):
                     # 清理选项文本中的冗余标签
                     clean_text = str(text).strip()
                     # 移除可能的 A. 或 A、 前缀
-                    clean_text = re.sub(r'^[A-D][.、]\s*', '', clean_text)
+                    clean_text = _OPT_PREFIX_RE.sub('', clean_text)
                     doc.add_paragraph(f"  {opt}: {clean_text}")
             
             doc.add_paragraph("-" * 30)
@@ -649,21 +937,28 @@ def generate_word_report_all(df_res: pd.DataFrame):
     bio.seek(0)
     return bio
 
+@st.cache_data(show_spinner=False, max_entries=2)
+def _csv_bytes(df: pd.DataFrame) -> bytes:
+    """
+    由内存中的数据生成 CSV；带 BOM 以便 Excel 正确识别中文
+    按数据内容缓存，数据未变化时页面交互不再重复序列化
+    """
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+
 def admin_view():
     """管理员视图"""
     st.header("🛠️ 管理员后台")
     
     # 题库选择
-    selected_bank = st.selectbox("选择要管理的题库", BANK_NAMES, key="bank_selector")
+    selected_bank = st.selectbox("选择要管理的题库", list_banks(), key="bank_selector")
     
     # 加载选中的题库
     df_q = load_questions(selected_bank)
     
     if df_q.empty:
         st.warning(f"题库 '{selected_bank}' 为空，请添加题目。")
-        df_q = pd.DataFrame(columns=['ID', 'Bank', 'Question', 'Option_A', 'Score_A', 
-                                     'Option_B', 'Score_B', 'Option_C', 'Score_C', 
-                                     'Option_D', 'Score_D'])
+        df_q = pd.DataFrame(columns=list(CANONICAL_COLS))
         df_q['Bank'] = selected_bank
 
     st.subheader(f"📚 {selected_bank} 管理")
@@ -701,12 +996,11 @@ def admin_view():
             edited_df['ID'] = range(1, len(edited_df) + 1)
             save_questions(edited_df, selected_bank)
             st.success(f"题库 '{selected_bank}' 已保存")
-            st.cache_data.clear()
             st.rerun()
     
     with col2:
         if st.button("🔄 重新加载", use_container_width=True):
-            st.cache_data.clear()
+            _questions_cache.clear()
             st.rerun()
 
     st.divider()
@@ -747,6 +1041,7 @@ def admin_view():
                 "Details": st.column_config.TextColumn("得分详情", disabled=True),
                 "Bank": st.column_config.TextColumn("所属题库", disabled=True),
                 "Answer_Details": st.column_config.TextColumn("答题详情JSON", disabled=True),
+                "Submission_ID": None,  # 内部提交编号，不在表格中显示
             }
         )
         
@@ -760,7 +1055,7 @@ def admin_view():
                     edited_res["Answer_Details"] = edited_res["Answer_Details"].apply(
                         lambda v: "" if pd.isna(v) else (json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else str(v))
                     )
-                    edited_res.to_excel(RESULTS_FILE, index=False)
+                    _write_workbook(RESULTS_FILE, {"Sheet1": edited_res})
                     st.success("成绩记录已更新")
                     st.rerun()
                 except Exception as e:
@@ -768,7 +1063,7 @@ def admin_view():
         
         col1, col2, col3 = st.columns(3)
         with col1:
-            csv_data = edited_res.to_csv(index=False, encoding="utf-8-sig")
+            csv_data = _csv_bytes(edited_res)
             st.download_button(
                 "📥 下载成绩 CSV",
                 data=csv_data,
@@ -783,7 +1078,7 @@ def admin_view():
                     st.warning("确定要清空所有成绩吗？再次点击按钮确认。")
                 else:
                     try:
-                        pd.DataFrame(columns=["Timestamp", "Name", "Phone", "Total_Score", "Details", "Bank", "Answer_Details"]).to_excel(RESULTS_FILE, index=False)
+                        _write_workbook(RESULTS_FILE, {"Sheet1": pd.DataFrame(columns=["Timestamp", "Name", "Phone", "Total_Score", "Details", "Bank", "Answer_Details"])})
                         st.session_state.confirm_clear = False
                         st.success("所有成绩已清空")
                         st.rerun()
@@ -884,7 +1179,11 @@ def admin_view():
 
 def main():
     """主函数"""
-    init_db()
+    # 初始化提示只显示一次（缓存返回的是同一列表，取出后即清空）
+    notices = init_db()
+    while notices:
+        level, msg = notices.pop(0)
+        getattr(st, level)(msg)
 
     st.title("🏢 企业员工面试测评系统")
 